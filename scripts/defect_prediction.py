@@ -1,199 +1,698 @@
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import heapq
+import json
+import math
 import os
-import random
+import sqlite3
 import subprocess
-from collections import defaultdict
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from operator import itemgetter, truediv
 from git import Repo
 
+# Bare, blob-less clones used for the history analysis, shared between runs
+HISTORY_CACHE_DIR = os.path.expanduser("~/.cache/glitch-whitcher")
+
+# Block size used when reading `git log` output in _count_files_for_shas()
+LOG_READ_SIZE = 8 << 20
+
+# Directory holding the file change counts of previous runs, one JSON file per HEAD commit
+CACHE_DIR = ".glitch_cache"
+CACHE_MAX_ENTRIES = 16
+
 # --- Approach 1: Predicting Faults from Cached History (BugCache/FixCache) ---
 
-def clone_repository(repo_url, local_path):
+def clone_repository(repo_url, local_path, depth=1, reference=None):
     """
     Clone a GitHub repository to a local directory.
     If the repository exists, simply use it.
+    Only the latest `depth` commits are fetched, since the working tree is all
+    REPD and the static analysis need; pass None for a full clone.
+    Objects already present in a complete (not partial) `reference` repository
+    are copied from it instead of downloaded; the clone is dissociated afterwards
+    so it keeps working if the reference is removed.
     """
     if not os.path.exists(local_path):
         print(f"Cloning repository from {repo_url}...")
-        Repo.clone_from(repo_url, local_path)
+        options = {"depth": depth} if depth else {}
+        if reference:
+            options["multi_options"] = [f"--reference-if-able={reference}", "--dissociate"]
+        Repo.clone_from(repo_url, local_path, **options)
     else:
         print(f"Repository already exists at {local_path}.")
 
-def extract_file_change_history(repo_path):
+def clone_history(repo_url, cache_dir=HISTORY_CACHE_DIR):
+    """
+    Clone or update a bare copy of a repository for the history analysis.
+    File contents are left out (--filter=blob:none) because the BugCache walk
+    runs with --no-renames and only reads commits and trees. The clone is kept
+    in `cache_dir` under a hash of the URL, so later runs, from any project,
+    only fetch new commits. Being a partial clone, it cannot serve as a
+    clone_repository() reference.
+    Returns the path of the bare repository.
+    """
+    history_path = os.path.join(cache_dir, hashlib.sha1(repo_url.encode()).hexdigest() + ".git")
+
+    if not os.path.exists(history_path):
+        print(f"Cloning history of {repo_url} into {history_path}...")
+        repo = Repo.clone_from(repo_url, history_path, bare=True, multi_options=["--filter=blob:none"])
+        # Bare clones have no fetch refspec; mirror the branches so updates move them
+        repo.git.config("remote.origin.fetch", "+refs/heads/*:refs/heads/*")
+    else:
+        print(f"Updating history of {repo_url} in {history_path}...")
+        Repo(history_path).git.fetch("--prune", "origin")
+
+    return history_path
+
+def _git_output(repo_path, *args):
+    """
+    Run a git command in the repository and return its standard output.
+    """
+    return subprocess.run(
+        ["git", "-C", repo_path, *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+def _count_files_for_shas(repo_path, shas, decay_days=None, now=None):
+    """
+    Count how many times each file was changed by the given commits.
+    A single `git log` run lists the changed files of every commit, so the
+    diffs are computed by git itself instead of per commit through GitPython.
+    Merge commits are diffed against their first parent. Rename detection is
+    turned off, so a renamed file counts as a change to both of its paths.
+    With `decay_days`, each change is weighted by exp(-age_days / decay_days),
+    measuring the commit age from the `now` timestamp.
+    """
+    if not shas:
+        return Counter()  # git log would fall back to HEAD
+
+    # In decay mode every commit starts with a NUL-prefixed line holding its commit time
+    pretty = "--pretty=format:%x00%ct" if decay_days is not None else "--pretty=format:"
+    process = subprocess.Popen(
+        [
+            "git", "-C", repo_path, "-c", "core.quotePath=false",
+            "log", "--stdin", "--no-walk=unsorted", "--name-only", "--no-renames",
+            "--diff-merges=first-parent", pretty,
+        ],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        bufsize=LOG_READ_SIZE,
+    )
+    # git reads every revision from stdin before it starts writing the log
+    process.stdin.write(("\n".join(shas) + "\n").encode())
+    process.stdin.close()
+
+    file_change_count = Counter()
+    weight = 1.0
+
+    def count(lines):
+        nonlocal weight
+        if decay_days is None:
+            file_change_count.update(lines)  # Counter does the increments in C
+            return
+        for line in lines:
+            if line.startswith("\0"):
+                age_days = max(0, now - int(line[1:])) / 86400
+                weight = math.exp(-age_days / decay_days)
+            elif line:
+                file_change_count[line] += weight
+
+    # Read the log in large blocks and count whole lines at a time.
+    # Blank lines separate the commits.
+    pending = b""
+    while True:
+        chunk = process.stdout.read(LOG_READ_SIZE)
+        if not chunk:
+            break
+        complete, _, pending = (pending + chunk).rpartition(b"\n")
+        count(complete.decode("utf-8", "replace").split("\n"))
+    count([pending.decode("utf-8", "replace")])
+    del file_change_count[""]
+
+    process.stdout.close()
+    if process.wait() != 0:
+        raise subprocess.CalledProcessError(process.returncode, process.args)
+
+    return file_change_count
+
+def extract_file_change_history(repo_path, numprocesses=None, revisions=("--all",),
+                                since=None, decay_days=None):
     """
     Extract commit history and count how many times each file was changed.
     Uses the BugCache/FixCache algorithm to predict defect-prone files.
+    The commits are split across `numprocesses` worker processes
+    (defaults to the number of CPUs); pass 1 to walk them in-process.
+    `revisions` are passed to `git rev-list` and default to all branches.
+    `since` (any date git understands, e.g. "90.days.ago") stops the walk at
+    older commits. With `decay_days`, recent changes weigh more: each change
+    counts exp(-age_days / decay_days) instead of 1.
     """
-    file_change_count = defaultdict(int)
-    repo = Repo(os.path.abspath(repo_path))
+    if numprocesses is not None and numprocesses < 1:
+        raise ValueError(f"numprocesses must be at least 1, got {numprocesses!r}")
+    if decay_days is not None and not decay_days > 0:
+        raise ValueError(f"decay_days must be greater than 0, got {decay_days!r}")
+
+    repo_path = os.path.abspath(repo_path)
+    file_change_count = Counter()
+    now = time.time()
+
+    # Collect all commits in all branches
+    since_args = (f"--since={since}",) if since else ()
+    shas = _git_output(repo_path, "rev-list", *since_args, *revisions).split()
+    if numprocesses is None:
+        numprocesses = os.cpu_count() or 1
+    numprocesses = max(1, min(numprocesses, len(shas)))  # Never more workers than commits, but at least one
 
-    # Iterate through all commits in all branches
-    for commit in repo.iter_commits('--all'):
-        changed_files = commit.stats.files.keys()
-        for file in changed_files:
-            file_change_count[file] += 1
+    if numprocesses == 1:
+        file_change_count.update(_count_files_for_shas(repo_path, shas, decay_days, now))
+        return file_change_count
+
+    # Interleave the commits so every worker gets a similar mix of small and large diffs
+    chunks = [shas[i::numprocesses] for i in range(numprocesses)]
+    with ProcessPoolExecutor(max_workers=numprocesses) as executor:
+        for counts in executor.map(_count_files_for_shas, repeat(repo_path), chunks,
+                                   repeat(decay_days), repeat(now)):
+            file_change_count.update(counts)
 
     return file_change_count
 
+def _cache_entries(cache_dir):
+    """
+    Return the paths of the cached change histories, least recently used first.
+    """
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith(".json")]
+    return sorted(entries, key=os.path.getmtime)
+
+def _read_cache_entry(path):
+    """
+    Load one cached change history, or return None if it is unreadable or malformed
+    (e.g. truncated by an interrupted run).
+    """
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (not isinstance(entry, dict) or not isinstance(entry.get("tips"), list)
+            or not isinstance(entry.get("file_change_count"), dict)):
+        return None
+    return entry
+
+def load_file_change_history(repo_path, cache_dir=CACHE_DIR, numprocesses=None,
+                             max_entries=CACHE_MAX_ENTRIES):
+    """
+    Return the file change counts of the repository, reusing previous runs.
+    Results are cached in `cache_dir` as <head_sha>.json together with the
+    branch tips that were walked. If the cache for HEAD is missing or the
+    branches have moved forward, the most recently used cache is extended with
+    only the commits that are not reachable from its tips. If any commit the
+    cache counted is no longer reachable from a branch (a branch was deleted,
+    rewound or force-pushed), the full history is walked again instead.
+    Unreadable cache files are treated as missing, and new ones are written
+    atomically so an interrupted run cannot leave a truncated file behind.
+    Every use refreshes a cache file's modification time, and only the
+    `max_entries` most recently used files are kept. Unreadable files are
+    skipped when choosing the base for an update and then removed.
+    """
+    repo_path = os.path.abspath(repo_path)
+    head = _git_output(repo_path, "rev-parse", "HEAD").strip()
+    tips = sorted(set(_git_output(repo_path, "rev-parse", "--all").split()))
+    cache_path = os.path.join(cache_dir, f"{head}.json")
+
+    cached = _read_cache_entry(cache_path) if os.path.exists(cache_path) else None
+    base_path = cache_path if cached is not None else None
+    broken = []
+    if cached is None:
+        # Base the update on the most recently used entry that can still be read
+        for path in reversed(_cache_entries(cache_dir)):
+            if path == cache_path:
+                continue  # Unreadable, and about to be rewritten
+            cached = _read_cache_entry(path)
+            if cached is not None:
+                base_path = path
+                break
+            broken.append(path)
+    if cached is not None:
+        os.utime(base_path)  # Mark as recently used
+
+    if cached is not None and cached["tips"] == tips:
+        print(f"Using cached change history from {base_path}.")
+        return Counter(cached["file_change_count"])
+
+    file_change_count = None
+    if cached is not None:
+        print(f"Updating cached change history from {base_path}...")
+        try:
+            # Counts can only be added, so every cached commit must still be on a branch
+            dropped = int(_git_output(repo_path, "rev-list", "--count", *cached["tips"], "--not", "--all"))
+            if dropped == 0:
+                file_change_count = Counter(cached["file_change_count"])
+                file_change_count.update(extract_file_change_history(
+                    repo_path, numprocesses, revisions=("--all", "--not", *cached["tips"])))
+        except subprocess.CalledProcessError:
+            pass  # Some of the cached tips no longer exist at all
+        if file_change_count is None:
+            print("Cached change history is no longer usable, walking the full history.")
+    if file_change_count is None:
+        file_change_count = extract_file_change_history(repo_path, numprocesses)
+
+    # Write to a temporary file first so readers only ever see complete entries
+    os.makedirs(cache_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=cache_dir, suffix=".tmp", delete=False) as f:
+        json.dump({"tips": tips, "file_change_count": file_change_count}, f)
+    os.replace(f.name, cache_path)
+
+    # Evict unreadable entries and the least recently used histories beyond the limit
+    stale = set(broken)
+    entries = [path for path in _cache_entries(cache_dir) if path not in stale]
+    if max_entries > 0:
+        stale.update(entries[:-max_entries])
+    for path in stale:
+        os.remove(path)
+
+    return file_change_count
+
+def _normalize(scores, total):
+    """
+    Divide every value of a file -> score mapping by `total`.
+    map() over operator.truediv keeps the per-file division in C rather than
+    running a Python-level loop body for each of the (possibly 100k) files.
+    """
+    return dict(zip(scores, map(truediv, scores.values(), repeat(total))))
+
 def calculate_bug_scores(file_change_count):
     """
     Calculate defect likelihood scores for each file.
     The score is normalized by the total number of changes.
     """
     total_changes = sum(file_change_count.values())
-    bug_scores = {}
 
     if total_changes == 0:
-        return bug_scores  # Avoid division by zero
+        return {}  # Avoid division by zero
 
-    for file, changes in file_change_count.items():
-        bug_scores[file] = changes / total_changes
+    return _normalize(file_change_count, total_changes)
 
-    return bug_scores
+def build_report(bug_scores, top_n=10):
+    """
+    Collect the top N files most likely to contain defects as a JSON-serializable dict.
+    """
+    # A bounded heap keeps only the top N instead of sorting every file
+    top_files = heapq.nlargest(top_n, bug_scores.items(), key=itemgetter(1))
+    return {
+        "top_n": top_n,
+        "files": [{"file": file, "score": score} for file, score in top_files],
+    }
 
 def generate_report(bug_scores, top_n=10):
     """
     Generate a report of the top N files most likely to contain defects.
     This report can be used for test prioritization or code review focus.
+    The report is assembled first and written in one call.
+    """
+    report = build_report(bug_scores, top_n)
+    lines = [f"Top {top_n} files most likely to contain defects:"]
+    lines.extend(f"{i}. {entry['file']} (Score: {entry['score']:.4f})"
+                 for i, entry in enumerate(report["files"], 1))
+    sys.stdout.write("\n".join(lines) + "\n")
+
+# --- Working Tree Scan shared by REPD and Static Analysis ---
+
+# Source file extensions scored by the REPD model
+REPD_EXTENSIONS = frozenset({".py", ".c", ".cpp", ".h", ".java", ".js", ".go"})
+
+# Static analysis bucket of scan_working_tree() for each source file extension
+ANALYSIS_EXTENSIONS = {
+    ".java": "java",  # SpotBugs
+    ".cpp": "cpp",    # cppcheck
+    ".h": "cpp",      # cppcheck
+    ".c": "c",        # cppcheck
+}
+
+# Directories that hold VCS data, dependencies or build output rather than sources
+SKIP_DIRS = frozenset({
+    ".git", "node_modules", "build", "target", "dist", "__pycache__", ".gradle", ".mvn", "out",
+})
+
+def _iter_files(directory):
     """
-    sorted_files = sorted(bug_scores.items(), key=lambda x: x[1], reverse=True)
-    print(f"Top {top_n} files most likely to contain defects:")
-    for i, (file, score) in enumerate(sorted_files[:top_n], 1):
-        print(f"{i}. {file} (Score: {score:.4f})")
+    Yield the path, the path relative to `directory` and the name of every
+    file below a directory.
+    Uses os.scandir so file types come from the directory entries
+    instead of an extra stat call per file, and builds the relative paths
+    while descending instead of calling os.path.relpath per file.
+    Directories in SKIP_DIRS and hidden directories are not entered.
+    """
+    pending = [(directory, "")]
+    while pending:
+        current, prefix = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if name not in SKIP_DIRS and not name.startswith("."):
+                            pending.append((entry.path, prefix + name + os.sep))
+                    elif entry.is_file():
+                        yield entry.path, prefix + name, name
+        except OSError:
+            continue  # Unreadable directory, skip it like os.walk does
+
+def scan_working_tree(repo_path):
+    """
+    Walk the working tree once and sort its source files by consumer.
+    Returns a dict with the REPD input under "repd" (paths relative to the
+    working tree) and the static analysis input under "java", "cpp" and "c"
+    (absolute paths).
+    """
+    working_dir = Repo(os.path.abspath(repo_path)).working_tree_dir
+    scan = {"repd": [], "java": [], "cpp": [], "c": []}
+
+    repd_files = scan["repd"]
+
+    for file_path, relative_path, file in _iter_files(working_dir):
+        # Optionally filter out non-code files (e.g., images, binaries)
+        extension = os.path.splitext(file)[1]
+        if extension in REPD_EXTENSIONS:
+            repd_files.append(relative_path)
+        bucket = ANALYSIS_EXTENSIONS.get(extension)
+        if bucket is not None and file != "module-info.java":  # Skip module-info.java
+            scan[bucket].append(file_path)
+
+    return scan
 
 # --- Approach 2: REPD Model for Defect Prediction ---
 
-def repd_defect_prediction(repo_path):
+def repd_defect_prediction(repo_path, scan=None):
     """
     Simulated implementation of the Reconstruction Error Probability Distribution (REPD) model.
     In a real scenario, this function would load a trained model (or train one using historical
     datasets such as those from NASA ESDS Data Metrics) and apply it to extract features from the source code.
     
-    Here, we simulate predictions by assigning a random defect score to each file.
+    Here, we simulate predictions by deriving a pseudo-random defect score from each file path,
+    so repeated runs over the same tree give the same scores.
+    Pass the result of scan_working_tree() as `scan` to reuse an existing walk.
     """
-    repd_scores = {}
-    repo = Repo(os.path.abspath(repo_path))
-    
     # Gather list of files in the repository by scanning the file tree
-    repo_files = []
-    for root, _, files in os.walk(repo.working_tree_dir):
-        for file in files:
-            # Optionally filter out non-code files (e.g., images, binaries)
-            if file.endswith(('.py', '.c', '.cpp', '.h', '.java', '.js', '.go')):
-                repo_files.append(os.path.relpath(os.path.join(root, file), repo.working_tree_dir))
-    
-    # Simulate a prediction: assign a random score between 0 and 1 to each file
-    for file in repo_files:
-        repd_scores[file] = random.random()
-    
+    if scan is None:
+        scan = scan_working_tree(repo_path)
+    repo_files = scan["repd"]
+
+    # Simulate a prediction: hash each path to a score between 0 and 1
+    repd_scores = {
+        file: int.from_bytes(hashlib.blake2b(file.encode(), digest_size=8).digest(), "big") / 2**64
+        for file in repo_files
+    }
+
     # Normalize scores to sum to 1 (optional)
     total_score = sum(repd_scores.values())
     if total_score > 0:
-        repd_scores = {file: score / total_score for file, score in repd_scores.items()}
+        repd_scores = _normalize(repd_scores, total_score)
     
     return repd_scores
 
 # --- New Function: Static Code Analysis for Multi-Language Support ---
 
-def run_static_analysis(repo_path):
+async def _run_analysis_tool(name, cmd, file_count, semaphore, stdin=None):
+    """
+    Run one static analysis tool over a batch of files and print its findings.
+    The tool runs as an asyncio subprocess, so other tools can run meanwhile;
+    `semaphore` bounds how many of them run at once.
+    """
+    async with semaphore:
+        print(f"Running {name} on {file_count} files...")
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE if stdin is not None else None,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            stdout, stderr = await process.communicate(stdin.encode() if stdin is not None else None)
+            # Do not raise an exception if the command fails
+            if process.returncode != 0:
+                report = f"{name} failed: {stderr.decode(errors='replace')}"
+            else:
+                report = stdout.decode(errors="replace")
+        except Exception as e:
+            report = f"Error running {name}: {e}"
+    # Each report is printed in one piece, so concurrent tools never interleave
+    if report:
+        print(report)
+
+async def _analyze_files(java_files, cpp_files, c_files, tmp_dir, semaphore):
+    """
+    Launch one batch per static analysis tool and wait for all of them.
+    """
+    jobs = []
+
+    # SpotBugs for Java; the targets are read from a file to stay clear of argument-length limits
+    if java_files:
+        file_list = os.path.join(tmp_dir, "spotbugs-targets.txt")
+        with open(file_list, "w") as f:
+            f.write("\n".join(java_files) + "\n")
+        jobs.append(_run_analysis_tool(
+            "SpotBugs",
+            ["spotbugs", "-textui", "-quiet", "-analyzeFromFile", file_list],
+            len(java_files),
+            semaphore,
+        ))
+
+    # cppcheck for C++ and C; it reads the file list from stdin and checks files in parallel
+    if cpp_files or c_files:
+        jobs.append(_run_analysis_tool(
+            "cppcheck",
+            ["cppcheck", "-j", str(os.cpu_count() or 1), "--file-list=-"],
+            len(cpp_files) + len(c_files),
+            semaphore,
+            stdin="\n".join(cpp_files + c_files) + "\n",
+        ))
+
+    await asyncio.gather(*jobs)
+
+def run_static_analysis(repo_path, scan=None):
     """
     Run static code analysis on the repository to identify bugs/defects.
     This example supports Java, C++, and C using appropriate tools.
+    Files are collected per tool first so every tool is launched only once
+    for the whole repository, and the tools run concurrently in one event loop.
+    Pass the result of scan_working_tree() as `scan` to reuse an existing walk.
     """
     print("\n=== Running Static Code Analysis to Identify Bugs/Defects ===")
-    repo = Repo(os.path.abspath(repo_path))
-    working_dir = repo.working_tree_dir
-
-    # Define static analysis tools for each language
-    tools = {
-        "java": "spotbugs",  # Use SpotBugs for Java
-        "cpp": "cppcheck",   # Use cppcheck for C++
-        "c": "cppcheck",     # Use cppcheck for C
-    }
 
-    # Scan the repository for files and run appropriate tools
-    for root, _, files in os.walk(working_dir):
-        for file in files:
-            file_path = os.path.join(root, file)
-            if file.endswith(".java") and not file.endswith("module-info.java"):  # Skip module-info.java
-                print(f"Running SpotBugs on {file_path}...")
-                try:
-                    result = subprocess.run(
-                        ["spotbugs", file_path],
-                        capture_output=True,
-                        text=True,
-                        check=False,  # Do not raise an exception if the command fails
-                    )
-                    if result.returncode != 0:
-                        print(f"SpotBugs failed for {file_path}: {result.stderr}")
-                    elif result.stdout:
-                        print(result.stdout)
-                except Exception as e:
-                    print(f"Error running SpotBugs on {file_path}: {e}")
-            elif file.endswith((".cpp", ".h")):
-                print(f"Running cppcheck on {file_path}...")
-                try:
-                    result = subprocess.run(
-                        ["cppcheck", file_path],
-                        capture_output=True,
-                        text=True,
-                        check=False,  # Do not raise an exception if the command fails
-                    )
-                    if result.returncode != 0:
-                        print(f"cppcheck failed for {file_path}: {result.stderr}")
-                    elif result.stdout:
-                        print(result.stdout)
-                except Exception as e:
-                    print(f"Error running cppcheck on {file_path}: {e}")
-            elif file.endswith(".c"):
-                print(f"Running cppcheck on {file_path}...")
-                try:
-                    result = subprocess.run(
-                        ["cppcheck", file_path],
-                        capture_output=True,
-                        text=True,
-                        check=False,  # Do not raise an exception if the command fails
-                    )
-                    if result.returncode != 0:
-                        print(f"cppcheck failed for {file_path}: {result.stderr}")
-                    elif result.stdout:
-                        print(result.stdout)
-                except Exception as e:
-                    print(f"Error running cppcheck on {file_path}: {e}")
-            else:
-                continue  # Skip non-code files
+    # Scan the repository for files handled by each tool
+    if scan is None:
+        scan = scan_working_tree(repo_path)
+
+    async def analyze(tmp_dir):
+        # Created inside the running loop for Python 3.9 compatibility
+        semaphore = asyncio.Semaphore(os.cpu_count() or 1)
+        await _analyze_files(scan["java"], scan["cpp"], scan["c"], tmp_dir, semaphore)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        asyncio.run(analyze(tmp_dir))
+
+# --- Result Storage for Historical Analysis ---
+
+def store_scores(db_path, repo_url, sha, model, scores, params=None):
+    """
+    Persist defect scores in a SQLite database for cross-run and cross-repository analysis.
+    `params` records the analysis options that produced the scores (e.g. the --since date
+    or decay), so differently configured runs for the same commit are kept apart.
+    Rows are keyed by repository, commit, model, parameters and file; storing the same
+    combination again replaces all of its rows. The rows are written with one executemany
+    in a single transaction.
+    """
+    params_key = json.dumps(params or {}, sort_keys=True)
+    created_at = int(time.time())
+    connection = sqlite3.connect(db_path)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        with connection:  # Commits once at the end, or rolls back on error
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS bug_scores (
+                    repo TEXT NOT NULL,
+                    sha TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    file TEXT NOT NULL,
+                    score REAL NOT NULL,
+                    created_at INTEGER NOT NULL,
+                    PRIMARY KEY (repo, sha, model, params, file)
+                )
+                """
+            )
+            # Drop files that are no longer scored so the stored scores match this run exactly
+            connection.execute(
+                "DELETE FROM bug_scores WHERE repo = ? AND sha = ? AND model = ? AND params = ?",
+                (repo_url, sha, model, params_key),
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO bug_scores VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((repo_url, sha, model, params_key, file, score, created_at)
+                 for file, score in scores.items()),
+            )
+    finally:
+        connection.close()
 
 # --- Main Analysis Function integrating both approaches --- 
 
-def main():
+def _positive_int(value):
+    """
+    argparse type for counts that must be at least 1.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value!r} is not an integer")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value!r} must be at least 1")
+    return number
+
+def _positive_float(value):
+    """
+    argparse type for options that only make sense above zero.
+    """
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a number")
+    if not number > 0:  # Also rejects NaN
+        raise argparse.ArgumentTypeError(f"{value!r} must be greater than 0")
+    return number
+
+def parse_args():
+    """
+    Parse command-line options for the analysis run.
+    """
+    parser = argparse.ArgumentParser(description="Predict defect-prone files in a Git repository.")
+    parser.add_argument(
+        "--numprocesses",
+        type=_positive_int,
+        default=None,
+        help="Number of worker processes used to walk the commit history (default: number of CPUs).",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=CACHE_DIR,
+        help=f"Directory for cached change history (default: {CACHE_DIR}).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always walk the full commit history instead of using the cache.",
+    )
+    parser.add_argument(
+        "--since",
+        default=None,
+        help="Only walk commits newer than this date, in any format git accepts (e.g. 90.days.ago).",
+    )
+    parser.add_argument(
+        "--decay-days",
+        type=_positive_float,
+        default=None,
+        help="Weight each change by exp(-age_days / DECAY_DAYS) so recent changes count more.",
+    )
+    parser.add_argument(
+        "--db",
+        default=None,
+        help="SQLite database to store the BugCache and REPD scores in (default: do not store).",
+    )
+    parser.add_argument(
+        "--format",
+        choices=("text", "json"),
+        default="text",
+        help="Output format (default: text). With json, stdout holds only one JSON document "
+             "with both reports and all progress output goes to stderr.",
+    )
+    return parser.parse_args()
+
+def run_analysis(args):
+    """
+    Run every analysis step and return the BugCache and REPD reports.
+    Text reports are printed along the way unless args.format is "json".
+    """
+    reports = {}
+
     # Configuration: update these values as needed or pass via environment variables/CI/CD
     repo_url = "https://github.com/eclipse-openj9/openj9"  # Example repository; can be parameterized.
     local_path = "./openj9_repo"  # Local clone directory
 
-    # Step 1: Clone the repository
+    # Step 1: Clone the working tree and the commit history of the repository
+    history_path = clone_history(repo_url)
     clone_repository(repo_url, local_path)
 
     # --- Approach 1 Execution ---
     print("\n=== Running BugCache/FixCache defect prediction (Approach 1) ===")
-    file_change_count = extract_file_change_history(local_path)
+    if args.no_cache or args.since or args.decay_days is not None:
+        # The cache only holds plain counts over the full history
+        file_change_count = extract_file_change_history(
+            history_path, numprocesses=args.numprocesses, since=args.since, decay_days=args.decay_days)
+    else:
+        file_change_count = load_file_change_history(
+            history_path, cache_dir=args.cache_dir, numprocesses=args.numprocesses)
     bug_scores = calculate_bug_scores(file_change_count)
-    generate_report(bug_scores)
+    reports["bugcache"] = build_report(bug_scores)
+    if args.format == "text":
+        generate_report(bug_scores)
+    if args.db:
+        head = _git_output(history_path, "rev-parse", "HEAD").strip()
+        params = {"since": args.since, "decay_days": args.decay_days}
+        store_scores(args.db, repo_url, head, "bugcache", bug_scores,
+                     params={key: value for key, value in params.items() if value is not None})
+
+    # Walk the working tree once for both REPD and the static analysis
+    scan = scan_working_tree(local_path)
 
     # --- Approach 2 Execution ---
     print("\n=== Running REPD defect prediction (Approach 2) ===")
     print("Running REPD defect prediction model...")
-    repd_scores = repd_defect_prediction(local_path)
+    repd_scores = repd_defect_prediction(local_path, scan=scan)
+    reports["repd"] = build_report(repd_scores)
     if repd_scores:
-        generate_report(repd_scores)
+        if args.format == "text":
+            generate_report(repd_scores)
+        if args.db:
+            head = _git_output(local_path, "rev-parse", "HEAD").strip()
+            store_scores(args.db, repo_url, head, "repd", repd_scores)
     else:
         print("REPD model not implemented yet.")
 
     # --- New Function Execution ---
-    run_static_analysis(local_path)
+    run_static_analysis(local_path, scan=scan)
 
     # Future integration:
     # - Compare results between the two approaches.
     # - Integrate with a CI/CD pipeline (e.g., GitHub Actions, Jenkins) to run this analysis on new tags or pull requests.
-    # - Optionally, store results in a database (MongoDB, PostgreSQL, etc.) for historical analysis.
-    
+    # - Optionally, store results in a shared database (MongoDB, PostgreSQL, etc.) next to the local SQLite file.
+
+    return reports
+
+def main():
+    args = parse_args()
+
+    if args.format == "json":
+        # Keep stdout machine-readable: progress, banners and tool output go to stderr,
+        # and stdout carries a single JSON document with both reports.
+        stdout = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            reports = run_analysis(args)
+        json.dump(reports, stdout)
+        stdout.write("\n")
+    else:
+        run_analysis(args)
+
 if __name__ == "__main__":
     main()
   
\ No newline at end of file